@@ -0,0 +1,215 @@
+#!/usr/bin/env python3
+"""
+Batch Runner
+Generates chapters for many videos through the OpenAI Batch API: half the
+price of interactive calls, in exchange for results within 24 hours.
+
+  python batch_runner.py run URL... COUNT      submit and wait for the results
+  python batch_runner.py submit URL... COUNT   submit and exit, printing the batch ID
+  python batch_runner.py collect BATCH_ID      wait for a submitted batch and save it
+"""
+
+import argparse
+import os
+import tempfile
+import time
+
+import orjson
+
+from generate_youtube_chapters import (
+    build_metadata_request,
+    finish_job,
+    get_openai_client,
+    load_cached_transcript,
+    parse_metadata_reply,
+    parse_youtube,
+    prepare_video,
+    print_outcomes,
+    resolve_api_key,
+)
+
+BATCH_DONE = ('completed', 'failed', 'expired', 'cancelled')
+
+def submit_batch(client, requests, metadata=None):
+    """Upload {custom_id: request kwargs} as a batch JSONL and start the batch"""
+    with tempfile.NamedTemporaryFile('wb', suffix='.jsonl', delete=False) as f:
+        for custom_id, body in requests.items():
+            f.write(orjson.dumps({
+                'custom_id': custom_id,
+                'method': 'POST',
+                'url': '/v1/chat/completions',
+                'body': body,
+            }) + b'\n')
+        batch_path = f.name
+
+    try:
+        with open(batch_path, 'rb') as f:
+            batch_file = client.files.create(file=f, purpose='batch')
+    finally:
+        os.remove(batch_path)
+
+    return client.batches.create(
+        input_file_id=batch_file.id,
+        endpoint='/v1/chat/completions',
+        completion_window='24h',
+        metadata=metadata
+    )
+
+def wait_for_batch(client, batch, poll_interval=60):
+    """Poll until the batch finishes and return {custom_id: decoded JSON reply}"""
+    while batch.status not in BATCH_DONE:
+        print(f"⏳ Batch {batch.id}: {batch.status}...")
+        time.sleep(poll_interval)
+        batch = client.batches.retrieve(batch.id)
+
+    if batch.status != 'completed' or not batch.output_file_id:
+        raise RuntimeError(f"Batch {batch.id} ended with status '{batch.status}'")
+
+    replies = {}
+    for line in client.files.content(batch.output_file_id).text.splitlines():
+        item = orjson.loads(line)
+        response = item.get('response') or {}
+        if response.get('status_code') != 200:
+            print(f"Batch request {item['custom_id']} failed: {item.get('error') or response}")
+            continue
+        content = response['body']['choices'][0]['message']['content']
+        replies[item['custom_id']] = orjson.loads(content)
+    return replies
+
+def start_batch(client, urls, num_chapters, questions=False, use_cache=True):
+    """Transcribe every URL and submit their chapter prompts as one batch.
+
+    Returns (batch, url_ids, prepared, outcomes): url_ids maps each URL to its
+    video ID, prepared holds {video_id: (video_info, transcript)} and outcomes
+    the videos that already failed. batch is None if nothing was submitted.
+    """
+    structure_type = "questions" if questions else "general"
+    
+    # Outcomes are keyed by video ID so the same video listed twice is only processed once
+    outcomes = {}
+    url_ids = {}
+    prepared = {}
+    for url in urls:
+        url_ids[url] = parse_youtube(url) or url
+        if url_ids[url] in outcomes or url_ids[url] in prepared:
+            continue
+        try:
+            video_id, video_info, transcript = prepare_video(url, use_cache)
+            prepared[video_id] = (video_info, transcript)
+        except Exception as e:
+            outcomes[url_ids[url]] = e
+    
+    if not prepared:
+        return None, url_ids, prepared, outcomes
+    
+    requests = {
+        video_id: build_metadata_request(transcript, num_chapters, structure_type)
+        for video_id, (_, transcript) in prepared.items()
+    }
+    # Recorded on the batch so collect_batch can finish it from another run
+    batch = submit_batch(client, requests, metadata={'num_chapters': str(num_chapters)})
+    print(f"📦 Submitted batch {batch.id} with {len(requests)} videos")
+    return batch, url_ids, prepared, outcomes
+
+def finish_batch(client, batch, prepared, num_chapters, poll_interval=60):
+    """Wait for a batch and save its chapters; returns {video_id: result or exception}"""
+    replies = wait_for_batch(client, batch, poll_interval)
+    outcomes = {}
+    for video_id, (video_info, transcript) in prepared.items():
+        try:
+            if video_id not in replies:
+                raise RuntimeError("No batch result returned.")
+            metadata = parse_metadata_reply(replies[video_id])
+            outcomes[video_id] = finish_job(video_id, video_info, transcript, metadata, num_chapters)
+        except Exception as e:
+            outcomes[video_id] = e
+    return outcomes
+
+def run_batch(urls, num_chapters, questions=False, api_key=None, poll_interval=60, use_cache=True):
+    """Transcribe every URL, send all chapter prompts as one batch, and save the results.
+
+    Returns (url, result or exception) pairs in input order.
+    """
+    client = get_openai_client(resolve_api_key(api_key))
+    batch, url_ids, prepared, outcomes = start_batch(client, urls, num_chapters, questions, use_cache)
+    if batch is not None:
+        outcomes.update(finish_batch(client, batch, prepared, num_chapters, poll_interval))
+    return [(url, outcomes[url_ids[url]]) for url in urls]
+
+def submit_only(urls, num_chapters, questions=False, api_key=None, use_cache=True):
+    """Transcribe every URL and submit the batch without waiting for it.
+
+    Returns the batch ID (None if every video failed) and prints any failures.
+    """
+    client = get_openai_client(resolve_api_key(api_key))
+    batch, url_ids, _, outcomes = start_batch(client, urls, num_chapters, questions, use_cache)
+    print_outcomes([(url, outcomes[url_ids[url]]) for url in urls if url_ids[url] in outcomes])
+    if batch is not None:
+        print(f"Collect the results later with: python batch_runner.py collect {batch.id}")
+        return batch.id
+    return None
+
+def collect_batch(batch_id, api_key=None, poll_interval=60):
+    """Wait for a batch submitted by submit_only and save its chapters.
+
+    The transcripts must still be in the transcript cache: they are what the
+    prompts were sampled from, so a video whose entry is gone fails rather than
+    being transcribed afresh. Returns (url, result or exception) pairs.
+    """
+    client = get_openai_client(resolve_api_key(api_key))
+    batch = client.batches.retrieve(batch_id)
+    num_chapters = int((batch.metadata or {}).get('num_chapters', 0))
+    if num_chapters <= 0:
+        raise ValueError(f"Batch {batch_id} was not submitted by batch_runner.")
+    
+    input_lines = client.files.content(batch.input_file_id).text.splitlines()
+    video_ids = [orjson.loads(line)['custom_id'] for line in input_lines if line]
+    
+    prepared = {}
+    outcomes = {}
+    for video_id in video_ids:
+        cached = load_cached_transcript(video_id)
+        if cached is None:
+            outcomes[video_id] = RuntimeError(
+                f"No cached transcript for {video_id}; it expired or was removed after submit, "
+                "so the batch's chapters can't be aligned. Submit this video again."
+            )
+        else:
+            prepared[video_id] = cached
+    
+    outcomes.update(finish_batch(client, batch, prepared, num_chapters, poll_interval))
+    return [(f"https://www.youtube.com/watch?v={video_id}", outcomes[video_id]) for video_id in video_ids]
+
+def main(argv=None):
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument("--api-key", help="OpenAI API key (optional if set in config.env)")
+    common.add_argument("--poll-interval", type=int, default=60, help="Seconds between batch status checks")
+    
+    parser = argparse.ArgumentParser(description="Generate YouTube chapters for many videos via the OpenAI Batch API")
+    commands = parser.add_subparsers(dest="command", required=True)
+    
+    for name, help_text in (("run", "Submit a batch and wait for the results"),
+                            ("submit", "Submit a batch and exit, printing its ID")):
+        command = commands.add_parser(name, parents=[common], help=help_text)
+        command.add_argument("urls", nargs="+", metavar="url", help="YouTube video URL")
+        command.add_argument("chapters", type=int, help="Number of chapters to generate")
+        command.add_argument("--questions", action="store_true", help="Structure for Q&A videos (intro + questions + song)")
+        command.add_argument("--no-cache", action="store_true", help="Ignore cached transcripts and transcribe again")
+    
+    collect = commands.add_parser("collect", parents=[common], help="Wait for a submitted batch and save its chapters")
+    collect.add_argument("batch_id", help="Batch ID printed by the submit command")
+    
+    args = parser.parse_args(argv)
+    
+    try:
+        if args.command == "run":
+            print_outcomes(run_batch(args.urls, args.chapters, args.questions, args.api_key, args.poll_interval, not args.no_cache))
+        elif args.command == "submit":
+            submit_only(args.urls, args.chapters, args.questions, args.api_key, not args.no_cache)
+        else:
+            print_outcomes(collect_batch(args.batch_id, args.api_key, args.poll_interval))
+    except Exception as e:
+        print(f"An error occurred: {e}")
+
+if __name__ == "__main__":
+    main()
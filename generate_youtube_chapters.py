@@ -5,439 +5,1161 @@ Generates AI-powered chapters for YouTube videos using Whisper transcription.
 """
 
 import argparse
-import json
+import asyncio
+import atexit
+import concurrent.futures
+import functools
 import os
 import re
 import pathlib
-import bisect
-import whisper
+import multiprocessing
+import subprocess
+import tempfile
+import threading
+import time
+import httpx
+import numpy as np
 import openai
+import orjson
+import tiktoken
 import yt_dlp
+from yt_dlp.cookies import YoutubeDLCookieJar, extract_cookies_from_browser
 from dotenv import load_dotenv
 
+from llm_cache import cached_chat
+
 # Load environment variables
 load_dotenv('config/config.env')
 
-def get_video_id(url):
-    """Extract video ID from YouTube URL"""
-    if "v=" in url:
-        return url.split("v=")[1].split("&")[0]
-    elif "youtu.be/" in url:
-        return url.split("youtu.be/")[1].split("?")[0]
-    return None
+# Loaded lazily, once per process, so repeated jobs (e.g. from the web app) reuse it
+_MODEL_LOCK = threading.Lock()
+_MODEL = None
+WHISPER_BATCH_SIZE = 16
+
+# Concurrent transcriptions sharing the one loaded model in main_many/main_combined
+WHISPER_WORKERS = 2
+
+# Transcriptions the in-process model is sized for: one CTranslate2 replica
+# each, with the cores split between them (cpu_threads is per replica). A
+# lone transcription (single URL, web job, batch runner) gets every core;
+# callers that transcribe concurrently raise it with size_whisper().
+WHISPER_CONCURRENCY = 1
+
+# Cores the in-process model may use in total (0 = all of them); gunicorn
+# workers each take an equal share via size_whisper()
+WHISPER_CPU_THREADS = 0
+
+# Model size name or a local CTranslate2 directory, e.g. one pre-quantized with
+# ct2-transformers-converter --quantization int8 (see docs/README.md)
+WHISPER_MODEL = os.getenv('WHISPER_MODEL', 'base')
+
+# CTranslate2 compute type; empty picks int8_float16 on GPU and int8 on CPU.
+# float16 can be faster on GPUs without fast int8 kernels.
+WHISPER_COMPUTE_TYPE = os.getenv('WHISPER_COMPUTE_TYPE', '')
+
+# Whisper consumes 16kHz mono audio
+WHISPER_SAMPLE_RATE = 16000
+
+# Give up on an audio download after 30 minutes rather than hang on a stalled stream
+DOWNLOAD_TIMEOUT = 1800
+
+# Transcribe long audio as ~5-minute chunks, cut at pauses, across this many processes
+# (1 = in-process). Each process loads its own model, so only raise this on CPU boxes
+# with spare cores.
+WHISPER_PROCESSES = int(os.getenv('WHISPER_PROCESSES', '1'))
+WHISPER_CHUNK_SECONDS = 300
+# How far either side of its nominal position a chunk cut may move to land in a pause
+WHISPER_CUT_WINDOW_SECONDS = 30
+_PROCESS_POOL = None
+
+# Optional executor for running Whisper off the calling thread. wsgi.py installs
+# gevent's native threadpool here so transcription doesn't stall the event loop.
+TRANSCRIBE_EXECUTOR = None
+
+# Make chat calls in the calling thread instead of on ChatBatcher's asyncio
+# loop. wsgi.py sets this under gevent, where each request is a greenlet and
+# the patched sync client already overlaps their round-trips.
+INLINE_CHAT = False
+
+# Transcripts from earlier runs, reused so re-running a video (e.g. with a
+# different chapter count) skips the download and Whisper entirely. Anchored
+# to this file, not the working directory, so every entry point shares it.
+TRANSCRIPT_CACHE_DIR = pathlib.Path(os.getenv('TRANSCRIPT_CACHE_DIR') or pathlib.Path(__file__).resolve().parent / 'cache')
+
+# Cached transcripts older than this are redone (0 keeps them forever)
+TRANSCRIPT_CACHE_TTL_DAYS = float(os.getenv('TRANSCRIPT_CACHE_TTL_DAYS', '30'))
+
+# Watch (v= anywhere in the query), short, embed and legacy /v/ and /e/ URL forms
+_YT_URL_RE = re.compile(
+    r'(?:https?://)?(?:www\.|m\.)?'
+    r'(?:youtube\.com/(?:watch\?(?:[^#\s]*&)?v=|embed/|v/|e/)|youtu\.be/)'
+    r'([a-zA-Z0-9_-]{11})'
+)
+
+# Words kept in chapter titles
+_TITLE_TOK = re.compile(r"[A-Za-z0-9'\-]+")
+
+# Model for chapter generation, and the input-token budget for each video's
+# transcript sample (400 segments of a dense lecture can run well past it)
+CHAT_MODEL = "gpt-4o-mini"
+SAMPLE_TOKEN_BUDGET = 8000
+
+# Videos per combined AI call; each needs up to 2400 reply tokens of the model's 16k
+COMBINE_MAX_VIDEOS = 4
+
+# Chapter timestamps from the model: HH:MM:SS, occasionally MM:SS
+_TS_RE = re.compile(r'(?:(\d+):)?(\d{1,2}):(\d{2})(?:\.\d+)?$')
+
+# List markers the model puts in front of titles: "1.", "12)", "-", "*", "•"
+_BULLET = re.compile(r'^\s*(?:[1-9][0-9]?[.)]|[-*\u2022])\s*')
+
+# Chrome cookies exported to a Netscape cookie file, so each download doesn't
+# re-read and decrypt Chrome's cookie database. Only the domains yt-dlp needs
+# are written, the export is redone after COOKIE_TTL seconds, and the file is
+# removed when the process exits.
+COOKIE_DOMAINS = ('youtube.com', 'google.com', 'googlevideo.com')
+COOKIE_TTL = 3600
+_COOKIE_LOCK = threading.Lock()
+_COOKIE_FILE = None
+_COOKIE_TIME = 0.0
+
+# yt-dlp errors that mean YouTube wants (fresher) login cookies
+_AUTH_ERROR_RE = re.compile(r'sign in|log in|login|cookies|private video|members', re.IGNORECASE)
+
+class JSONObjectScanner:
+    """Spot the end of the first JSON object in text that arrives in pieces.
+
+    Tracks brace depth (ignoring braces inside strings) so a streamed reply
+    can be parsed as soon as its closing brace arrives, without waiting for
+    any trailing prose. If on_item is given, it is also called with the text
+    of each object nested item_depth deep (e.g. each chapter) as it completes.
+    """
+    
+    def __init__(self, on_item=None, item_depth=2):
+        self.parts = []
+        self.depth = 0
+        self.in_string = False
+        self.escaped = False
+        self.on_item = on_item
+        self.item_depth = item_depth
+        self.item_parts = None
+    
+    def feed(self, text):
+        """Consume the next piece; return the full object text once it is complete"""
+        start = 0 if self.depth else None
+        item_start = 0 if self.item_parts is not None else None
+        for i, ch in enumerate(text):
+            if start is None:
+                # Skip any preamble before the opening brace
+                if ch != '{':
+                    continue
+                start = i
+            if self.in_string:
+                if self.escaped:
+                    self.escaped = False
+                elif ch == '\\':
+                    self.escaped = True
+                elif ch == '"':
+                    self.in_string = False
+            elif ch == '"':
+                self.in_string = True
+            elif ch == '{':
+                self.depth += 1
+                if self.on_item and self.depth == self.item_depth:
+                    self.item_parts = []
+                    item_start = i
+            elif ch == '}':
+                self.depth -= 1
+                if self.item_parts is not None and self.depth == self.item_depth - 1:
+                    self.on_item(''.join(self.item_parts) + text[item_start:i + 1])
+                    self.item_parts = item_start = None
+                if self.depth == 0:
+                    self.parts.append(text[start:i + 1])
+                    return ''.join(self.parts)
+        if start is not None:
+            self.parts.append(text[start:])
+        if item_start is not None:
+            self.item_parts.append(text[item_start:])
+        return None
+
+async def read_streamed_json(stream, on_item=None):
+    """Read a streamed chat completion until its first JSON object is complete"""
+    scanner = JSONObjectScanner(on_item)
+    async for chunk in stream:
+        if not chunk.choices:
+            continue
+        json_text = scanner.feed(chunk.choices[0].delta.content or '')
+        if json_text is not None:
+            await stream.close()
+            return json_text
+    raise ValueError("Response ended before the JSON object was complete")
+
+def read_streamed_json_sync(stream, on_item=None):
+    """read_streamed_json for a synchronous stream"""
+    scanner = JSONObjectScanner(on_item)
+    for chunk in stream:
+        if not chunk.choices:
+            continue
+        json_text = scanner.feed(chunk.choices[0].delta.content or '')
+        if json_text is not None:
+            stream.close()
+            return json_text
+    raise ValueError("Response ended before the JSON object was complete")
+
+class ChatBatcher:
+    """Run chat completion requests from any thread on one shared async client.
+
+    Callers submit request kwargs and get a Future back. A background thread
+    runs an event loop that starts each request as soon as it arrives, at most
+    max_in_flight at once, over one long-lived AsyncOpenAI client, so
+    concurrent requests overlap their network round-trips and a slow call
+    never holds up the ones queued behind it.
+    """
+    
+    def __init__(self, api_key, max_in_flight=8, max_retries=5, retry_base_delay=1.0):
+        self.api_key = api_key
+        self.max_in_flight = max_in_flight
+        self.max_retries = max_retries
+        self.retry_base_delay = retry_base_delay
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._worker, daemon=True)
+        self._thread.start()
+    
+    def submit(self, on_item=None, **kwargs):
+        """Queue a chat.completions.create call and return its Future.
+
+        With stream=True the Future resolves to the reply's first JSON object
+        as text rather than to a response object, and on_item (if given) is
+        called from the batcher's thread with each nested object as it arrives.
+        """
+        future = concurrent.futures.Future()
+        self._loop.call_soon_threadsafe(self._start, kwargs, future, on_item)
+        return future
+    
+    def _start(self, kwargs, future, on_item):
+        self._loop.create_task(self._run(kwargs, future, on_item))
+    
+    async def _run(self, kwargs, future, on_item):
+        # Resolve the Future on every exit path, cancellation included, so a
+        # caller blocked in .result() is never left waiting
+        try:
+            async with self._semaphore:
+                result = await self._call(kwargs, on_item)
+        except BaseException as e:
+            future.set_exception(e)
+            if not isinstance(e, Exception):
+                raise
+        else:
+            future.set_result(result)
+    
+    async def _call(self, kwargs, on_item=None):
+        # Exponential backoff on 429s, like the cookbook's parallel request processor
+        for attempt in range(self.max_retries + 1):
+            try:
+                response = await self._client.chat.completions.create(**kwargs)
+                break
+            except openai.RateLimitError:
+                if attempt == self.max_retries:
+                    raise
+                await asyncio.sleep(self.retry_base_delay * 2 ** attempt)
+        if kwargs.get('stream'):
+            # Streamed requests resolve to the JSON text of the reply
+            return await read_streamed_json(response, on_item)
+        return response
+    
+    def _worker(self):
+        # One loop and one pooled HTTP/2 client for the batcher's lifetime, so
+        # connections (and their TLS sessions) are reused across requests.
+        # Submitted requests only start once run_forever is running.
+        asyncio.set_event_loop(self._loop)
+        self._semaphore = asyncio.Semaphore(self.max_in_flight)
+        self._client = openai.AsyncOpenAI(
+            api_key=self.api_key,
+            http_client=httpx.AsyncClient(
+                http2=True,
+                limits=httpx.Limits(max_connections=self.max_in_flight, max_keepalive_connections=self.max_in_flight)
+            )
+        )
+        self._loop.run_forever()
+
+class InlineChat:
+    """ChatBatcher's interface, making each call synchronously in the caller.
+
+    submit() blocks until the reply (with the same 429 backoff) and returns an
+    already resolved Future, over the shared synchronous client.
+    """
+    
+    def __init__(self, api_key, max_retries=5, retry_base_delay=1.0):
+        self.api_key = api_key
+        self.max_retries = max_retries
+        self.retry_base_delay = retry_base_delay
+    
+    def submit(self, on_item=None, **kwargs):
+        """Make a chat.completions.create call and return its resolved Future"""
+        future = concurrent.futures.Future()
+        try:
+            future.set_result(self._call(kwargs, on_item))
+        except Exception as e:
+            future.set_exception(e)
+        return future
+    
+    def _call(self, kwargs, on_item=None):
+        client = get_openai_client(self.api_key)
+        for attempt in range(self.max_retries + 1):
+            try:
+                response = client.chat.completions.create(**kwargs)
+                break
+            except openai.RateLimitError:
+                if attempt == self.max_retries:
+                    raise
+                time.sleep(self.retry_base_delay * 2 ** attempt)
+        if kwargs.get('stream'):
+            return read_streamed_json_sync(response, on_item)
+        return response
+
+_chat_batchers = {}
+_clients_lock = threading.Lock()
+
+def get_chat_batcher(api_key):
+    """Return the shared ChatBatcher (or InlineChat) for an API key, starting it on first use"""
+    with _clients_lock:
+        if api_key not in _chat_batchers:
+            _chat_batchers[api_key] = InlineChat(api_key) if INLINE_CHAT else ChatBatcher(api_key)
+        return _chat_batchers[api_key]
+
+_openai_clients = {}
+
+def get_openai_client(api_key):
+    """Return a shared synchronous OpenAI client (pooled HTTP/2 connections) for an API key"""
+    with _clients_lock:
+        if api_key not in _openai_clients:
+            _openai_clients[api_key] = openai.OpenAI(
+                api_key=api_key,
+                http_client=httpx.Client(
+                    http2=True,
+                    limits=httpx.Limits(max_connections=8, max_keepalive_connections=4)
+                )
+            )
+        return _openai_clients[api_key]
+
+def parse_youtube(url):
+    """Validate a YouTube URL and return its video ID, or None if invalid"""
+    match = _YT_URL_RE.match(url)
+    return match.group(1) if match else None
 
 def format_time(seconds):
     """Convert seconds to HH:MM:SS format"""
-    h = int(seconds // 3600)
-    m = int((seconds % 3600) // 60)
-    s = int(seconds % 60)
+    return _format_whole_seconds(int(seconds))
+
+@functools.lru_cache(maxsize=4096)
+def _format_whole_seconds(total):
+    m, s = divmod(total, 60)
+    h, m = divmod(m, 60)
     return f"{h:02}:{m:02}:{s:02}"
 
-def get_video_info(url):
-    """Get video information including title"""
-    ydl_opts = {
-        'quiet': True,
-        'no_warnings': True,
-        'cookiesfrombrowser': ('chrome',),
-        'skip_download': True,
-        'extract_flat': False,
-    }
+def sample_transcript_text(transcript, sample_size):
+    """Render a time-uniform sample of the transcript as "[HH:MM:SS] text" lines.
+
+    Takes the first segment in each of sample_size equal-duration buckets, so
+    stretches with many short segments don't crowd out the rest of the video.
+    """
+    duration = transcript[-1]['start'] if transcript else 0
+    bucket = duration / max(1, sample_size)
+    if bucket <= 0:
+        return ''.join([f"[{format_time(e['start'])}] {e['text']}\n" for e in transcript[:sample_size]])
     
-    with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+    lines = []
+    next_t = 0.0
+    for e in transcript:
+        if e['start'] >= next_t:
+            lines.append(f"[{format_time(e['start'])}] {e['text']}\n")
+            next_t = (e['start'] // bucket + 1) * bucket
+    return ''.join(lines)
+
+@functools.lru_cache(maxsize=None)
+def _get_encoding(model):
+    return tiktoken.encoding_for_model(model)
+
+def budget_transcript_text(transcript, sample_size=400, budget=SAMPLE_TOKEN_BUDGET):
+    """sample_transcript_text, thinned until the sample fits in budget tokens"""
+    enc = _get_encoding(CHAT_MODEL)
+    while True:
+        text = sample_transcript_text(transcript, sample_size)
+        tokens = len(enc.encode_ordinary(text))
+        if tokens <= budget or sample_size <= 1:
+            return text
+        # Segments are roughly even in length, so scale straight to the budget
+        sample_size = max(1, min(sample_size - 1, int(sample_size * budget / tokens * 0.95)))
+
+def chapters_path(video_id):
+    """Where a video's chapters file is saved, so any process can find it from the ID"""
+    return pathlib.Path('chapters') / f"{video_id}.txt"
+
+def _is_cookie_domain(domain):
+    domain = domain.lstrip('.')
+    return any(domain == d or domain.endswith('.' + d) for d in COOKIE_DOMAINS)
+
+def _remove_cookie_file():
+    if _COOKIE_FILE:
         try:
-            info = ydl.extract_info(url, download=False)
-            return {
-                'id': info.get('id', ''),
-                'title': info.get('title', 'Unknown Video'),
-                'duration': info.get('duration', 0)
-            }
-        except Exception as e:
-            print(f"Failed to extract video info: {e}")
-            # Fallback: use video ID as title
-            video_id = get_video_id(url)
-            return {
-                'id': video_id,
-                'title': f"Video_{video_id}",
-                'duration': 0
-            }
-
-def sanitize_filename(title):
-    """Convert video title to safe filename"""
-    # Remove invalid filename characters
-    import re
-    title = re.sub(r'[<>:"/\\|?*]', '', title)
-    title = title.replace(' ', '_')
-    # Limit length
-    if len(title) > 100:
-        title = title[:100]
-    return title
-
-def download_audio(video_id, url, video_title=""):
-    """Download audio from YouTube video"""
-    ydl_opts = {
-        'format': 'worst[ext=mp4][acodec!=none]/worst[ext=webm][acodec!=none]/worst',
-        'outtmpl': f'{video_id}_audio.%(ext)s',
-        'postprocessors': [{
-            'key': 'FFmpegExtractAudio',
-            'preferredcodec': 'mp3',
-            'preferredquality': '128',
-        }],
+            os.remove(_COOKIE_FILE)
+        except OSError:
+            pass
+
+atexit.register(_remove_cookie_file)
+
+def get_cookie_file(refresh=False):
+    """Return the path of the exported Chrome cookie file.
+
+    The cookies are exported on first use, again once the export is older
+    than COOKIE_TTL, and immediately if refresh is set. A re-export replaces
+    the file in place, so the path stays the same for the whole process.
+    """
+    global _COOKIE_FILE, _COOKIE_TIME
+    with _COOKIE_LOCK:
+        if refresh or _COOKIE_FILE is None or time.monotonic() - _COOKIE_TIME > COOKIE_TTL:
+            jar = YoutubeDLCookieJar()
+            for cookie in extract_cookies_from_browser('chrome'):
+                if _is_cookie_domain(cookie.domain):
+                    jar.set_cookie(cookie)
+            # mkstemp files are private to this user
+            fd, path = tempfile.mkstemp(prefix='ytdlp_cookies_', suffix='.txt')
+            os.close(fd)
+            try:
+                jar.save(path, ignore_discard=True, ignore_expires=True)
+                if _COOKIE_FILE:
+                    os.replace(path, _COOKIE_FILE)
+                else:
+                    _COOKIE_FILE = path
+            except BaseException:
+                os.remove(path)
+                raise
+            _COOKIE_TIME = time.monotonic()
+        return _COOKIE_FILE
+
+def ydl_options():
+    """yt-dlp options for resolving a video's audio stream"""
+    return {
+        # Audio-only, preferring plain HTTPS over DASH/HLS manifests that
+        # ffmpeg has to fetch segment by segment
+        'format': 'bestaudio[protocol^=https]/bestaudio/best',
         'noplaylist': True,
-        'cookiesfrombrowser': ('chrome',),
+        'cookiefile': get_cookie_file(),
         'retries': 1,
         'fragment_retries': 1,
+        'quiet': True,
+        'no_warnings': True,
+    }
+
+def extract_video_info(url):
+    """Resolve a video's metadata and audio stream URL with yt-dlp"""
+    # A fresh YoutubeDL per call: closing it releases its HTTP sessions and
+    # writes refreshed cookies back to the cookie file
+    with yt_dlp.YoutubeDL(ydl_options()) as ydl:
+        return ydl.extract_info(url, download=False) or {}
+
+def download_audio(video_id, url):
+    """Stream a video's audio as 16kHz mono float32 PCM.
+
+    Returns (audio, video_info). ffmpeg decodes straight from the media URL
+    into the format Whisper consumes, so no intermediate mp3 is encoded,
+    written to disk, and decoded again.
+    """
+    try:
+        info = extract_video_info(url)
+    except yt_dlp.utils.DownloadError as e:
+        if not _AUTH_ERROR_RE.search(str(e)):
+            raise
+        # The exported cookies may be stale; re-export them and try once more
+        print("YouTube asked for login cookies, re-exporting them from Chrome...")
+        get_cookie_file(refresh=True)
+        info = extract_video_info(url)
+    
+    video_info = {
+        'id': info.get('id') or video_id,
+        'title': info.get('title') or f"Video_{video_id}",
+        'duration': info.get('duration', 0)
     }
+    media_url = info.get('url')
+    if not media_url:
+        raise RuntimeError("No downloadable audio stream found.")
+    
+    cmd = ['ffmpeg', '-nostdin', '-loglevel', 'error']
+    headers = ''.join(f"{k}: {v}\r\n" for k, v in info.get('http_headers', {}).items())
+    if headers:
+        cmd += ['-headers', headers]
+    cmd += ['-i', media_url, '-vn', '-ac', '1', '-ar', str(WHISPER_SAMPLE_RATE), '-f', 's16le', 'pipe:1']
+    
+    print(f"Downloading audio for video {video_id}...")
+    try:
+        proc = subprocess.run(cmd, capture_output=True, timeout=DOWNLOAD_TIMEOUT)
+    except subprocess.TimeoutExpired:
+        raise RuntimeError(f"Audio download timed out after {DOWNLOAD_TIMEOUT // 60} minutes")
+    if proc.returncode != 0:
+        raise RuntimeError(f"ffmpeg failed: {proc.stderr.decode(errors='replace').strip()}")
     
-    with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-        print(f"Downloading audio for video {video_id}...")
-        ydl.extract_info(url, download=True)
-        return f"{video_id}_audio.mp3"
+    audio = np.frombuffer(proc.stdout, dtype=np.int16).astype(np.float32) / 32768.0
+    return audio, video_info
 
-def transcribe_with_whisper(audio_file):
-    """Use Whisper to transcribe audio file"""
+def _load_whisper(cpu_threads, num_workers):
+    """Load the batched Whisper pipeline with the given CTranslate2 threading"""
     print("Loading Whisper model...")
-    model = whisper.load_model("base")
+    # Imported here so cached-transcript runs and the Batch API collect
+    # step don't pay for CTranslate2/faster-whisper at startup
+    import ctranslate2
+    from faster_whisper import BatchedInferencePipeline, WhisperModel
+    
+    # int8 weights on CPU (VNNI), int8 weights with fp16 activations on GPU
+    device = "cuda" if ctranslate2.get_cuda_device_count() > 0 else "cpu"
+    compute_type = WHISPER_COMPUTE_TYPE or ("int8_float16" if device == "cuda" else "int8")
+    print(f"Whisper model: {WHISPER_MODEL} ({device}, {compute_type})")
+    model = WhisperModel(
+        WHISPER_MODEL, device=device, compute_type=compute_type,
+        cpu_threads=cpu_threads, num_workers=num_workers
+    )
+    # Runs many 30s chunks per forward pass instead of one at a time
+    return BatchedInferencePipeline(model=model)
+
+def size_whisper(concurrency, cpu_threads=None):
+    """Size the in-process model for this many concurrent transcriptions.
+
+    cpu_threads, if given, is the total core budget split between them.
+    Only takes effect if called before the model is loaded.
+    """
+    global WHISPER_CONCURRENCY, WHISPER_CPU_THREADS
+    with _MODEL_LOCK:
+        if _MODEL is None:
+            WHISPER_CONCURRENCY = max(1, concurrency)
+            if cpu_threads is not None:
+                WHISPER_CPU_THREADS = max(1, cpu_threads)
+
+def get_whisper():
+    """Return the process-wide batched Whisper pipeline, loading it on first use"""
+    global _MODEL
+    with _MODEL_LOCK:
+        if _MODEL is None:
+            cores = WHISPER_CPU_THREADS or os.cpu_count() or 1
+            _MODEL = _load_whisper(max(1, cores // WHISPER_CONCURRENCY), WHISPER_CONCURRENCY)
+        return _MODEL
+
+def transcribe_with_whisper(audio, model=None):
+    """Use Whisper to transcribe an audio file path or 16kHz float32 samples"""
+    if model is None:
+        model = get_whisper()
     
     print("Transcribing audio...")
-    result = model.transcribe(audio_file)
+    # Silero VAD drops silent stretches before the encoder ever sees them
+    segments, _ = model.transcribe(
+        audio,
+        batch_size=WHISPER_BATCH_SIZE,
+        vad_filter=True,
+        vad_parameters=dict(min_silence_duration_ms=500)
+    )
     
     # Convert Whisper output to our transcript format
     transcript = []
-    for segment in result["segments"]:
+    for segment in segments:
         transcript.append({
-            'start': segment['start'],
-            'text': segment['text'].strip()
+            'start': segment.start,
+            'text': segment.text.strip()
         })
     
     return transcript
 
-def generate_youtube_titles(transcript, chapters, api_key):
-    """Generate optimized YouTube titles based on transcript and chapters"""
-    client = openai.OpenAI(api_key=api_key)
-    
-    # Sample transcript to stay within token limits
-    sample_size = min(150, len(transcript))
-    step = max(1, len(transcript) // sample_size)
-    sampled = transcript[::step]
-    
-    transcript_text = ""
-    for entry in sampled:
-        timestamp = format_time(entry['start'])
-        transcript_text += f"[{timestamp}] {entry['text']}\n"
-    
-    # Convert chapters to text
-    chapters_text = "\n".join([f"{ch['timestamp']} {ch['title']}" for ch in chapters])
+def _init_chunk_worker():
+    """Process-pool initializer: load this process's model before its first chunk"""
+    global _MODEL
+    # Each process transcribes one chunk at a time, so it gets one model worker
+    # and an equal share of the cores across the WHISPER_PROCESSES processes
+    _MODEL = _load_whisper(max(1, (os.cpu_count() or 1) // WHISPER_PROCESSES), 1)
+
+def _transcribe_chunk(offset, samples):
+    """Process-pool worker: transcribe one chunk and shift it to video time"""
+    return [{'start': offset + seg['start'], 'text': seg['text']} for seg in transcribe_with_whisper(samples)]
+
+def _get_process_pool():
+    global _PROCESS_POOL
+    with _MODEL_LOCK:
+        if _PROCESS_POOL is None:
+            # spawn, not fork: the parent may already hold threads and a loaded model
+            _PROCESS_POOL = concurrent.futures.ProcessPoolExecutor(
+                max_workers=WHISPER_PROCESSES,
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=_init_chunk_worker
+            )
+        return _PROCESS_POOL
+
+def _speech_timestamps(samples):
+    """Silero VAD speech spans (in samples), with the same pause length as transcription"""
+    from faster_whisper.vad import VadOptions, get_speech_timestamps
+    return get_speech_timestamps(samples, VadOptions(min_silence_duration_ms=500))
+
+def _chunk_bounds(audio):
+    """Sample offsets splitting audio into roughly WHISPER_CHUNK_SECONDS pieces.
+
+    Each cut lands in the middle of the pause nearest its nominal position
+    within WHISPER_CUT_WINDOW_SECONDS, so chunk boundaries don't split words,
+    and falls back to the nominal position if that window has no pause. VAD
+    only runs over those windows, not the whole file, since each chunk's
+    transcription runs its own.
+    """
+    chunk = WHISPER_CHUNK_SECONDS * WHISPER_SAMPLE_RATE
+    window = WHISPER_CUT_WINDOW_SECONDS * WHISPER_SAMPLE_RATE
+    bounds = [0]
+    for target in range(chunk, len(audio), chunk):
+        lo = max(bounds[-1], target - window)
+        hi = min(len(audio), target + window)
+        speech = _speech_timestamps(audio[lo:hi])
+        pauses = [lo + (a['end'] + b['start']) // 2 for a, b in zip(speech, speech[1:])]
+        bounds.append(min(pauses, key=lambda cut: abs(cut - target), default=target))
+    bounds.append(len(audio))
+    return bounds
+
+def transcribe_audio(audio):
+    """Transcribe audio, fanning long in-memory audio out over WHISPER_PROCESSES workers"""
+    chunk = WHISPER_CHUNK_SECONDS * WHISPER_SAMPLE_RATE
+    if WHISPER_PROCESSES <= 1 or not isinstance(audio, np.ndarray) or len(audio) <= chunk:
+        return transcribe_with_whisper(audio)
     
-    prompt = f"""
-Analyze this educational video content and generate 5 high-performing YouTube titles optimized for maximum views and SEO.
+    pool = _get_process_pool()
+    bounds = _chunk_bounds(audio)
+    futures = [
+        pool.submit(_transcribe_chunk, start / WHISPER_SAMPLE_RATE, audio[start:end])
+        for start, end in zip(bounds, bounds[1:])
+    ]
+    transcript = [seg for future in futures for seg in future.result()]
+    transcript.sort(key=lambda seg: seg['start'])
+    return transcript
 
-CHAPTERS:
-{chapters_text}
+DEFAULT_TITLES = ["Complete Educational Guide", "Everything You Need to Know", "Master the Basics", "Essential Review", "Ultimate Study Guide"]
+DEFAULT_TAGS = "#EducationalContent #Tutorial #Learning"
 
-TRANSCRIPT SAMPLE:
-{transcript_text}
+# Structured-output schema for one video's reply, so timestamps and titles
+# always come back as strings in the expected shape
+METADATA_SCHEMA = {
+    'type': 'object',
+    'properties': {
+        'chapters': {
+            'type': 'array',
+            'items': {
+                'type': 'object',
+                'properties': {'timestamp': {'type': 'string'}, 'title': {'type': 'string'}},
+                'required': ['timestamp', 'title'],
+                'additionalProperties': False,
+            },
+        },
+        'titles': {'type': 'array', 'items': {'type': 'string'}},
+        'tags': {'type': 'string'},
+    },
+    'required': ['chapters', 'titles', 'tags'],
+    'additionalProperties': False,
+}
 
-Create titles that are:
+def _metadata_instructions(num_chapters, structure_type="general"):
+    """The chapters/titles/tags rules shared by the single and combined prompts"""
+    if structure_type == "questions":
+        chapter_rules = f"""Create YouTube chapters for a video with {num_chapters-2} questions plus introduction and song.
+- Output EXACTLY {num_chapters} chapters: Introduction, Questions (use topic names, not "Q1"), Song.
+- Titles must be concise, <=4 words.
+- Base timestamps on when topics are first mentioned."""
+    else:
+        chapter_rules = f"""Create exactly {num_chapters} chapters.
+- Each chapter marks when a NEW topic is first introduced
+- Timestamps must correspond to when topics are first mentioned
+- Titles must be 4 words or less
+- Start with 00:00:00 Introduction"""
+    
+    return f"""
+"chapters": {chapter_rules}
+
+"titles": exactly 5 high-performing YouTube titles optimized for maximum views and SEO that:
 1. Start with "Step 1 Prep -" for medical content (or "Study Guide -" for other educational content)
 2. List the main topics covered, separated by commas
-3. Include at least 5 specific topics from the chapters
+3. Include at least 5 specific topics from your chapters
 4. Keep total length under 100 characters for YouTube optimization
 5. Use medical terminology when appropriate
 6. Make topics sound comprehensive and high-yield
+Examples: "Step 1 Prep - Cardiology, Nephrology, Pulmonology, GI, Neurology", "Step 1 Prep - Diabetes, Hypertension, Heart Failure, COPD, Stroke"
+
+"tags": 15-20 space-separated hashtags for maximum SEO discovery that are:
+1. Highly relevant to the content
+2. Mix of broad and specific terms
+3. Include educational keywords if applicable
+4. Include popular exam/study terms if medical/academic content
+"""
+
+def build_metadata_request(transcript, num_chapters, structure_type="general"):
+    """Build the chat.completions.create kwargs asking for chapters, titles and tags.
+
+    The transcript sample is sent once and the model answers with a single
+    JSON object, instead of three round-trips each re-sending the transcript.
+    """
+    # Sample transcript to stay within token limits
+    transcript_text = budget_transcript_text(transcript)
+    
+    prompt = f"""
+Analyze this educational video transcript and output strict JSON only:
+{{"chapters":[{{"timestamp":"HH:MM:SS","title":"..."}}, ...], "titles":["...", ...], "tags":"#tag1 #tag2 ..."}}
+{_metadata_instructions(num_chapters, structure_type)}
+TRANSCRIPT SAMPLE:\n{transcript_text}
+"""
+    
+    return {
+        'model': CHAT_MODEL,
+        'messages': [
+            {"role": "system", "content": "Return strict JSON only with the requested chapters, titles and tags."},
+            {"role": "user", "content": prompt}
+        ],
+        'max_tokens': 2400,
+        'temperature': 0.1,
+        'response_format': {
+            "type": "json_schema",
+            "json_schema": {"name": "video_metadata", "strict": True, "schema": METADATA_SCHEMA},
+        },
+    }
 
-Examples of desired format:
-- "Step 1 Prep - Cardiology, Nephrology, Pulmonology, GI, Neurology"
-- "Step 1 Prep - Diabetes, Hypertension, Heart Failure, COPD, Stroke"
+def build_combined_metadata_request(transcripts, num_chapters, structure_type="general"):
+    """Like build_metadata_request, for several videos in one call.
 
-Focus on listing the actual medical topics/conditions covered in the video. Extract specific topics from the chapter titles.
+    transcripts maps video_id -> transcript. The instructions are sent once for
+    all of them and the model answers {"videos": {video_id: {...}}}.
+    """
+    samples = ''.join(
+        f"\n=== VIDEO {video_id} ===\n{budget_transcript_text(transcript)}"
+        for video_id, transcript in transcripts.items()
+    )
+    
+    prompt = f"""
+Analyze each of these educational video transcripts separately and output strict JSON only, with one entry per video ID:
+{{"videos": {{"VIDEO_ID": {{"chapters":[{{"timestamp":"HH:MM:SS","title":"..."}}, ...], "titles":["...", ...], "tags":"#tag1 #tag2 ..."}}, ...}}}}
 
-Output exactly 5 titles, one per line:
+For every video:
+{_metadata_instructions(num_chapters, structure_type)}
+TRANSCRIPT SAMPLES:{samples}
 """
     
+    return {
+        'model': CHAT_MODEL,
+        'messages': [
+            {"role": "system", "content": "Return strict JSON only with the requested chapters, titles and tags for every video."},
+            {"role": "user", "content": prompt}
+        ],
+        'max_tokens': 2400 * len(transcripts),
+        'temperature': 0.1,
+        'response_format': {"type": "json_object"},
+    }
+
+def parse_metadata_reply(data):
+    """Clean up the model's decoded JSON reply into chapters, titles and tags.
+
+    Only the single-video request is schema-checked by the API, so
+    wrongly-typed fields are coerced or replaced with defaults here.
+    """
+    chapters = data.get('chapters')
+    chapters = [
+        {'timestamp': str(ch.get('timestamp') or '00:00:00'), 'title': str(ch.get('title') or 'Chapter')}
+        for ch in (chapters if isinstance(chapters, list) else []) if isinstance(ch, dict)
+    ]
+    
+    # Clean up and limit to 5 titles
+    titles = data.get('titles')
+    clean_titles = []
+    for title in titles if isinstance(titles, list) else []:
+        title = str(title).strip()
+        if title and not title.startswith('#') and len(title) > 10:
+            # Remove numbering or bullets if present
+            clean_titles.append(_BULLET.sub('', title).strip())
+    
+    tags = data.get('tags') or DEFAULT_TAGS
+    if isinstance(tags, list):
+        tags = ' '.join(str(tag) for tag in tags)
+    elif not isinstance(tags, str):
+        tags = DEFAULT_TAGS
+    
+    return {
+        'chapters': chapters,
+        'titles': clean_titles[:5] or DEFAULT_TITLES,
+        'tags': tags.strip(),
+    }
+
+def generate_all_metadata(transcript, num_chapters, api_key, structure_type="general", use_cache=True, on_chapter=None):
+    """Use AI to create chapters, title suggestions and tags in one call.
+
+    Returns {'chapters': [...], 'titles': [...], 'tags': str}, or None if the
+    call fails. use_cache=False skips the cached reply and asks the model again.
+    on_chapter, if given, is called with each raw chapter dict as it streams in;
+    errors it raises are logged and ignored.
+    """
+    request = build_metadata_request(transcript, num_chapters, structure_type)
+    on_item = None
+    if on_chapter:
+        def on_item(text):
+            # A broken preview must not fail the AI call it rides on
+            try:
+                on_chapter(orjson.loads(text))
+            except Exception as e:
+                print(f"Chapter preview failed: {e}")
     try:
-        response = client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[
-                {"role": "system", "content": "Generate YouTube titles optimized for educational content engagement and SEO."},
-                {"role": "user", "content": prompt}
-            ],
-            max_tokens=400,
-            temperature=0.3
-        )
-        
-        titles = response.choices[0].message.content.strip().split('\n')
-        # Clean up and limit to 5 titles
-        clean_titles = []
-        for title in titles:
-            title = title.strip()
-            if title and not title.startswith('#') and len(title) > 10:
-                # Remove numbering if present
-                if title.startswith(('1.', '2.', '3.', '4.', '5.')):
-                    title = title[2:].strip()
-                clean_titles.append(title)
-        
-        return clean_titles[:5] if clean_titles else ["Complete Guide to [Topic]", "Everything You Need to Know", "Master [Subject] Fast", "Essential [Topic] Review", "Ultimate [Subject] Prep"]
+        json_text = cached_chat(get_chat_batcher(api_key), use_cache=use_cache, on_item=on_item, **request, stream=True)
+        data = orjson.loads(json_text)
     except Exception as e:
-        print(f"Title generation failed: {e}")
-        return ["Complete Educational Guide", "Everything You Need to Know", "Master the Basics", "Essential Review", "Ultimate Study Guide"]
+        print(f"AI analysis failed: {e}")
+        return None
+    return parse_metadata_reply(data)
 
-def generate_youtube_tags(transcript, chapters, api_key):
-    """Generate optimized YouTube tags based on transcript and chapters"""
-    client = openai.OpenAI(api_key=api_key)
-    
-    # Sample transcript to stay within token limits
-    sample_size = min(200, len(transcript))
-    step = max(1, len(transcript) // sample_size)
-    sampled = transcript[::step]
+def generate_combined_metadata(transcripts, num_chapters, api_key, structure_type="general", use_cache=True):
+    """Generate metadata for several videos ({video_id: transcript}) in one AI call.
+
+    Returns {video_id: metadata} for the videos the reply covered; an empty
+    dict if the call fails.
+    """
+    request = build_combined_metadata_request(transcripts, num_chapters, structure_type)
+    try:
+        json_text = cached_chat(get_chat_batcher(api_key), use_cache=use_cache, **request, stream=True)
+        videos = orjson.loads(json_text).get('videos')
+        if not isinstance(videos, dict):
+            raise ValueError("reply has no 'videos' object")
+    except Exception as e:
+        print(f"AI analysis failed: {e}")
+        return {}
     
-    transcript_text = ""
-    for entry in sampled:
-        timestamp = format_time(entry['start'])
-        transcript_text += f"[{timestamp}] {entry['text']}\n"
+    # One malformed entry only fails its own video, not the whole group
+    metadata = {}
+    for video_id in transcripts:
+        if not isinstance(videos.get(video_id), dict):
+            continue
+        try:
+            metadata[video_id] = parse_metadata_reply(videos[video_id])
+        except Exception as e:
+            print(f"AI analysis failed for {video_id}: {e}")
+    return metadata
+
+def parse_timestamp(ts):
+    """Convert an [H:]MM:SS timestamp to seconds; malformed values map to 0"""
+    m = _TS_RE.match(str(ts).strip())
+    if not m:
+        return 0
+    return int(m.group(1) or 0) * 3600 + int(m.group(2)) * 60 + int(m.group(3))
+
+def snap_timestamps_to_transcript(chapters, transcript):
+    """Snap chapter timestamps to nearest transcript segment starts"""
+    starts = np.fromiter((seg['start'] for seg in transcript), dtype=np.float64, count=len(transcript))
+    times = np.fromiter((parse_timestamp(ch.get('timestamp', '00:00:00')) for ch in chapters), dtype=np.float64, count=len(chapters))
+    titles = [' '.join(_TITLE_TOK.findall(ch.get('title', 'Chapter')))[:120].strip() for ch in chapters]
     
-    # Convert chapters to text
-    chapters_text = "\n".join([f"{ch['timestamp']} {ch['title']}" for ch in chapters])
+    # Segment starting at or before each chapter time
+    idx = np.clip(np.searchsorted(starts, times, side='right') - 1, 0, None)
+    snapped = starts[idx]
     
-    prompt = f"""
-Analyze this video content and generate 15-20 optimized YouTube tags for maximum SEO discovery.
+    # Keep the first chapter landing on each segment, sorted by time
+    _, first = np.unique(snapped, return_index=True)
+    return [(float(snapped[i]), titles[i]) for i in first]
 
-CHAPTERS:
-{chapters_text}
+def format_chapters_file(titles, chapters, tags):
+    """Render titles, chapters and tags in the chapters/*.txt layout"""
+    lines = ["SUGGESTED TITLES:"]
+    lines.extend(f"{i}. {title}" for i, title in enumerate(titles, 1))
+    lines.append("\n\nCHAPTERS:")
+    lines.extend(f"{ch['timestamp']} {ch['title']}" for ch in chapters)
+    lines.append(f"\n\nYOUTUBE TAGS:\n{tags}")
+    return "\n".join(lines) + "\n"
 
-TRANSCRIPT SAMPLE:
-{transcript_text}
+def write_text_file(path, content):
+    """Write content to path as UTF-8 with LF line endings, replacing any existing file"""
+    # Explicit encoding: titles carry emoji and accents that the Windows
+    # locale codec (cp1252) would reject or mangle
+    with open(path, 'w', encoding='utf-8', newline='\n') as f:
+        f.write(content)
 
-Generate hashtags that are:
-1. Highly relevant to the content
-2. Mix of broad and specific terms  
-3. Include educational keywords if applicable
-4. Optimized for search discovery
-5. Include popular exam/study terms if medical/academic content
+def resolve_api_key(api_key=None):
+    """Return the given key or OPENAI_API_KEY, raising ValueError if neither is set"""
+    api_key = api_key or os.getenv('OPENAI_API_KEY')
+    if not api_key:
+        raise ValueError("OpenAI API key not found! Set OPENAI_API_KEY in config/config.env or use --api-key")
+    return api_key
 
-Output format: #tag1 #tag2 #tag3 (space-separated hashtags)
-"""
-    
+def transcript_cache_fresh(path):
+    """Whether a cached transcript exists and is within TRANSCRIPT_CACHE_TTL_DAYS"""
     try:
-        response = client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[
-                {"role": "system", "content": "Generate YouTube hashtags optimized for SEO discovery."},
-                {"role": "user", "content": prompt}
-            ],
-            max_tokens=300,
-            temperature=0.1
-        )
-        
-        return response.choices[0].message.content.strip()
-    except Exception as e:
-        print(f"Tag generation failed: {e}")
-        return "#EducationalContent #Tutorial #Learning"
+        age = time.time() - path.stat().st_mtime
+    except FileNotFoundError:
+        return False
+    return not TRANSCRIPT_CACHE_TTL_DAYS or age < TRANSCRIPT_CACHE_TTL_DAYS * 86400
 
-def generate_ai_chapters(transcript, num_chapters, api_key, structure_type="general"):
-    """Use AI to analyze transcript and create intelligent chapters"""
-    client = openai.OpenAI(api_key=api_key)
+def transcript_cache_path(video_id):
+    return TRANSCRIPT_CACHE_DIR / f"{video_id}_transcript.json"
+
+def load_cached_transcript(video_id):
+    """Return (video_info, transcript) from the transcript cache, or None on a miss.
+
+    Stale, unreadable or corrupt entries count as misses, so the caller
+    transcribes again instead of failing the job.
+    """
+    path = transcript_cache_path(video_id)
+    if not transcript_cache_fresh(path):
+        return None
+    try:
+        with open(path, 'rb') as f:
+            cached = orjson.loads(f.read())
+        return cached['video_info'], cached['transcript']
+    except (OSError, ValueError, KeyError, TypeError) as e:
+        print(f"Ignoring unreadable cached transcript {path}: {e}")
+        return None
+
+def save_cached_transcript(video_id, video_info, transcript):
+    """Store a transcript, with the video info a cache hit needs; returns the path"""
+    path = transcript_cache_path(video_id)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    # Write a temp file and rename it into place, so readers and concurrent
+    # jobs for the same video never see a half-written entry
+    fd, tmp_path = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.", suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(orjson.dumps({'video_info': video_info, 'transcript': transcript}, option=orjson.OPT_INDENT_2))
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+    return path
+
+def prepare_video(url, use_cache=True):
+    """Download and transcribe one video, or load its cached transcript; returns (video_id, video_info, transcript)"""
+    video_id = parse_youtube(url)
+    if not video_id:
+        raise ValueError("Invalid YouTube URL.")
     
-    # Sample transcript to stay within token limits
-    sample_size = min(400, len(transcript))
-    step = max(1, len(transcript) // sample_size)
-    sampled = transcript[::step]
+    cached = load_cached_transcript(video_id) if use_cache else None
+    if cached is not None:
+        video_info, transcript = cached
+        print(f"Video title: {video_info['title']}")
+        print(f"Loaded cached transcript with {len(transcript)} segments")
+        return video_id, video_info, transcript
     
-    transcript_text = ""
-    for entry in sampled:
-        timestamp = format_time(entry['start'])
-        transcript_text += f"[{timestamp}] {entry['text']}\n"
+    # Fetch audio (the same extraction gives us the video title), loading the
+    # Whisper model in the background on first use instead of after the download.
+    # The process pool loads its own models, so the parent doesn't need one.
+    if _MODEL is None and WHISPER_PROCESSES <= 1 and TRANSCRIBE_EXECUTOR is not None:
+        # Under gevent, load on the executor's native threads; a patched
+        # thread is a greenlet and the load would block the event loop
+        model_future = TRANSCRIBE_EXECUTOR.submit(get_whisper)
+        audio, video_info = download_audio(video_id, url)
+        model_future.result()
+    elif _MODEL is None and WHISPER_PROCESSES <= 1:
+        with concurrent.futures.ThreadPoolExecutor(max_workers=1) as loader:
+            model_future = loader.submit(get_whisper)
+            audio, video_info = download_audio(video_id, url)
+            model_future.result()
+    else:
+        audio, video_info = download_audio(video_id, url)
+    print(f"Video title: {video_info['title']}")
     
-    # Get video duration
-    duration = transcript[-1]['start'] if transcript else 0
-    duration_minutes = duration / 60
+    # Transcribe
+    if TRANSCRIBE_EXECUTOR is not None:
+        transcript = TRANSCRIBE_EXECUTOR.submit(transcribe_audio, audio).result()
+    else:
+        transcript = transcribe_audio(audio)
     
-    if structure_type == "questions":
-        prompt = f"""
-Create YouTube chapters for a video with {num_chapters-2} questions plus introduction and song.
-Output EXACTLY {num_chapters} chapters: Introduction, Questions (use topic names, not "Q1"), Song.
-Output strict JSON: {{"chapters":[{{"timestamp":"HH:MM:SS","title":"..."}}, ...]}}
-Titles must be concise, <=4 words.
-Base timestamps on when topics are first mentioned.
+    if not transcript:
+        raise RuntimeError("Failed to generate transcript.")
+    
+    print(f"Generated transcript with {len(transcript)} segments")
+    print(f"Video duration: {format_time(transcript[-1]['start'])}")
+    
+    transcript_file = save_cached_transcript(video_id, video_info, transcript)
+    print(f"Transcript saved to {transcript_file}")
+    
+    return video_id, video_info, transcript
 
-TRANSCRIPT SAMPLE:\n{transcript_text}
-"""
-    else:
-        prompt = f"""
-Analyze this educational video transcript and create exactly {num_chapters} chapters.
-Rules:
-- Each chapter marks when a NEW topic is first introduced
-- Timestamps must correspond to when topics are first mentioned
-- Titles must be 4 words or less
-- Output strict JSON only: {{"chapters":[{{"timestamp":"HH:MM:SS","title":"..."}}, ...]}}
-- Start with 00:00:00 Introduction
+def finish_job(video_id, video_info, transcript, metadata, num_chapters):
+    """Snap the AI chapters to the transcript, save the chapters file and build the result"""
+    if not metadata or not metadata['chapters']:
+        raise RuntimeError("Failed to generate chapters.")
+    
+    # Snap timestamps to transcript segments
+    aligned_chapters = snap_timestamps_to_transcript(metadata['chapters'], transcript)
+    final_chapters = [{'timestamp': format_time(t), 'title': title} for t, title in aligned_chapters[:num_chapters]]
+    youtube_titles = metadata['titles']
+    youtube_tags = metadata['tags']
+    
+    # Save chapters and tags; written before returning so a download right
+    # after the job finds the complete file and write errors fail the job
+    raw_content = format_chapters_file(youtube_titles, final_chapters, youtube_tags)
+    chapters_file = chapters_path(video_id)
+    chapters_file.parent.mkdir(exist_ok=True)
+    write_text_file(chapters_file, raw_content)
+    
+    return {
+        'video_id': video_id,
+        'video_title': video_info['title'],
+        'chapters': final_chapters,
+        'titles': youtube_titles,
+        'tags': youtube_tags,
+        'raw_content': raw_content,
+        'chapters_file': str(chapters_file),
+    }
 
-TRANSCRIPT SAMPLE:\n{transcript_text}
-"""
+def run_job(url, num_chapters, questions=False, api_key=None, use_cache=True, on_chapter=None):
+    """Run the full pipeline for one video and return the generated metadata.
+
+    Raises ValueError for bad input and RuntimeError when a pipeline stage
+    fails, so callers (the CLI and the web app) can report errors their own way.
+    use_cache=False redoes the transcription and AI call even when cached;
+    on_chapter is passed through to generate_all_metadata.
+    """
+    api_key = resolve_api_key(api_key)
+    video_id, video_info, transcript = prepare_video(url, use_cache)
     
-    try:
-        response = client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[
-                {"role": "system", "content": "Return strict JSON only with the requested number of chapters."},
-                {"role": "user", "content": prompt}
-            ],
-            max_tokens=2000,
-            temperature=0.1
-        )
-        
-        response_text = response.choices[0].message.content
-        json_start = response_text.find('{')
-        json_end = response_text.rfind('}') + 1
-        json_text = response_text[json_start:json_end]
-        chapters_data = json.loads(json_text)
-        
-        return chapters_data['chapters']
-        
-    except Exception as e:
-        print(f"AI analysis failed: {e}")
-        return None
+    # Generate chapters, titles and tags with AI
+    structure_type = "questions" if questions else "general"
+    print("🤖 Generating chapters, titles and tags...")
+    metadata = generate_all_metadata(transcript, num_chapters, api_key, structure_type, use_cache, on_chapter)
+    
+    return finish_job(video_id, video_info, transcript, metadata, num_chapters)
 
-def snap_timestamps_to_transcript(chapters, transcript):
-    """Snap chapter timestamps to nearest transcript segment starts"""
-    starts = [seg['start'] for seg in transcript]
-    aligned = []
+def main_many(urls, num_chapters, questions=False, api_key=None, use_cache=True):
+    """Run several videos through one resident Whisper model.
+
+    Up to WHISPER_WORKERS jobs run at once, overlapping one video's download
+    and OpenAI call with another's transcription. Returns (url, result or
+    exception) pairs in input order.
+    """
+    size_whisper(WHISPER_WORKERS)
+    with concurrent.futures.ThreadPoolExecutor(max_workers=WHISPER_WORKERS) as pool:
+        futures = [pool.submit(run_job, url, num_chapters, questions, api_key, use_cache) for url in urls]
+        outcomes = []
+        for url, future in zip(urls, futures):
+            try:
+                outcomes.append((url, future.result()))
+            except Exception as e:
+                outcomes.append((url, e))
+        return outcomes
+
+def main_combined(urls, num_chapters, questions=False, api_key=None, use_cache=True):
+    """Transcribe several videos, then generate their metadata COMBINE_MAX_VIDEOS per AI call.
+
+    Sends the prompt instructions once per group instead of once per video.
+    Returns (url, result or exception) pairs in input order.
+    """
+    api_key = resolve_api_key(api_key)
+    structure_type = "questions" if questions else "general"
     
-    for ch in chapters:
-        ts = ch.get('timestamp', '00:00:00')
-        title = ' '.join(re.findall(r"[A-Za-z0-9'\-]+", ch.get('title', 'Chapter')))[:120].strip()
-        
-        try:
-            h, m, s = map(int, ts.split(':'))
-            t = h * 3600 + m * 60 + s
-        except:
-            t = 0
-            
-        idx = bisect.bisect_right(starts, t) - 1
-        if idx < 0:
-            idx = 0
-        snap = starts[idx]
-        aligned.append((snap, title))
-    
-    # Remove duplicates and sort
-    seen = set()
-    unique = []
-    for t, title in aligned:
-        if t in seen:
-            continue
-        seen.add(t)
-        unique.append((t, title))
+    # Outcomes are keyed by video ID so the same video listed twice is only processed once
+    url_ids = {url: parse_youtube(url) or url for url in urls}
+    first_urls = {}
+    for url in urls:
+        first_urls.setdefault(url_ids[url], url)
+    
+    outcomes = {}
+    prepared = {}
+    size_whisper(WHISPER_WORKERS)
+    with concurrent.futures.ThreadPoolExecutor(max_workers=WHISPER_WORKERS) as pool:
+        futures = {key: pool.submit(prepare_video, url, use_cache) for key, url in first_urls.items()}
+        for key, future in futures.items():
+            try:
+                prepared[key] = future.result()
+            except Exception as e:
+                outcomes[key] = e
+    
+    keys = list(prepared)
+    groups = [
+        {key: prepared[key][2] for key in keys[i:i + COMBINE_MAX_VIDEOS]}
+        for i in range(0, len(keys), COMBINE_MAX_VIDEOS)
+    ]
+    print(f"🤖 Generating chapters, titles and tags for {len(keys)} videos in {len(groups)} calls...")
+    
+    # The groups' AI calls run concurrently on the shared ChatBatcher
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max(1, len(groups))) as pool:
+        futures = [
+            pool.submit(generate_combined_metadata, group, num_chapters, api_key, structure_type, use_cache)
+            for group in groups
+        ]
+    
+    for group, future in zip(groups, futures):
+        metadata = future.result()
+        for key in group:
+            video_id, video_info, transcript = prepared[key]
+            try:
+                outcomes[key] = finish_job(video_id, video_info, transcript, metadata.get(key), num_chapters)
+            except Exception as e:
+                outcomes[key] = e
+    
+    return [(url, outcomes[url_ids[url]]) for url in urls]
+
+def print_result(result):
+    """Print a finished job's summary for the CLI"""
+    print(f"\n✅ Generated {len(result['chapters'])} chapters!")
+    print(f"💾 Saved to: {result['chapters_file']}")
     
-    unique.sort(key=lambda x: x[0])
-    return unique
+    print("\n📝 Suggested Titles:")
+    for i, title in enumerate(result['titles'], 1):
+        print(f"   {i}. {title}")
+    
+    print("\n📋 Chapter Preview:")
+    for ch in result['chapters']:
+        print(f"   {ch['timestamp']} {ch['title']}")
+    print(f"\n🏷️ YouTube Tags:\n{result['tags']}")
+
+def print_streamed_chapter(chapter):
+    """Show a chapter as the model writes it, before timestamps are snapped"""
+    print(f"   … {chapter.get('timestamp', '')} {chapter.get('title', '')}")
+
+def print_outcomes(outcomes):
+    """Print (url, result or exception) pairs from a multi-video run"""
+    for url, outcome in outcomes:
+        print(f"\n===== {url} =====")
+        if isinstance(outcome, ValueError):
+            print(f"Error: {outcome}")
+        elif isinstance(outcome, Exception):
+            print(f"An error occurred: {outcome}")
+        else:
+            print_result(outcome)
 
-def main():
+def main(argv=None):
     parser = argparse.ArgumentParser(description="Generate YouTube chapters using AI and Whisper")
-    parser.add_argument("url", help="YouTube video URL")
+    parser.add_argument("urls", nargs="+", metavar="url", help="YouTube video URL (several URLs share one loaded Whisper model)")
     parser.add_argument("chapters", type=int, help="Number of chapters to generate")
     parser.add_argument("--questions", action="store_true", help="Structure for Q&A videos (intro + questions + song)")
     parser.add_argument("--api-key", help="OpenAI API key (optional if set in config.env)")
+    parser.add_argument("--batch", action="store_true", help="Send the AI requests through the OpenAI Batch API (half price, results within 24h)")
+    parser.add_argument("--batch-async", action="store_true", help="Like --batch, but submit and exit; collect later with batch_runner.py collect")
+    parser.add_argument("--combine", action="store_true", help=f"Ask for several videos' chapters in one AI call ({COMBINE_MAX_VIDEOS} videos per call)")
+    parser.add_argument("--no-cache", action="store_true", help="Ignore cached transcripts and AI responses and regenerate them")
     
-    args = parser.parse_args()
+    args = parser.parse_args(argv)
     
-    # Get API key
-    api_key = args.api_key or os.getenv('OPENAI_API_KEY')
-    if not api_key:
-        print("Error: OpenAI API key not found!")
-        print("Set OPENAI_API_KEY in config/config.env or use --api-key")
+    if args.batch_async:
+        from batch_runner import submit_only
+        try:
+            submit_only(args.urls, args.chapters, args.questions, args.api_key, not args.no_cache)
+        except Exception as e:
+            print(f"An error occurred: {e}")
         return
     
-    video_id = get_video_id(args.url)
-    if not video_id:
-        print("Invalid YouTube URL.")
+    if args.batch:
+        from batch_runner import run_batch
+        try:
+            print_outcomes(run_batch(args.urls, args.chapters, args.questions, args.api_key, use_cache=not args.no_cache))
+        except Exception as e:
+            print(f"An error occurred: {e}")
         return
     
-    # Get video information first
-    print("Getting video information...")
-    video_info = get_video_info(args.url)
-    if video_info:
-        video_title = video_info['title']
-        sanitized_title = sanitize_filename(video_title)
-        print(f"Video title: {video_title}")
-    else:
-        # Fallback to video ID if title extraction fails
-        video_title = f"Video_{video_id}"
-        sanitized_title = video_id
-        print(f"Using video ID as title: {video_title}")
+    if args.combine and len(args.urls) > 1:
+        try:
+            print_outcomes(main_combined(args.urls, args.chapters, args.questions, args.api_key, not args.no_cache))
+        except Exception as e:
+            print(f"An error occurred: {e}")
+        return
     
-    try:
-        # Download audio
-        audio_file = download_audio(video_id, args.url, video_title)
-        
-        # Transcribe
-        transcript = transcribe_with_whisper(audio_file)
-        
-        if not transcript:
-            print("Failed to generate transcript.")
-            return
-        
-        print(f"Generated transcript with {len(transcript)} segments")
-        print(f"Video duration: {format_time(transcript[-1]['start'])}")
-        
-        # Save transcript
-        transcript_file = f"{video_id}_transcript.json"
-        with open(transcript_file, 'w') as f:
-            json.dump(transcript, f, indent=2)
-        print(f"Transcript saved to {transcript_file}")
-        
-        # Generate chapters with AI
-        structure_type = "questions" if args.questions else "general"
-        chapters = generate_ai_chapters(transcript, args.chapters, api_key, structure_type)
-        
-        if chapters:
-            # Snap timestamps to transcript segments
-            aligned_chapters = snap_timestamps_to_transcript(chapters, transcript)
-            
-            # Convert to format needed for optimization
-            chapters_for_optimization = [{'timestamp': format_time(t), 'title': title} for t, title in aligned_chapters[:args.chapters]]
-            
-            # Generate YouTube optimizations
-            print("🏷️  Generating YouTube tags...")
-            youtube_tags = generate_youtube_tags(transcript, chapters_for_optimization, api_key)
-            
-            print("📝 Generating optimized titles...")
-            youtube_titles = generate_youtube_titles(transcript, chapters_for_optimization, api_key)
-            
-            # Save chapters and tags
-            pathlib.Path('chapters').mkdir(exist_ok=True)
-            chapters_file = f"chapters/{sanitized_title}.txt"
-            
-            with open(chapters_file, 'w') as f:
-                f.write("SUGGESTED TITLES:\n")
-                for i, title in enumerate(youtube_titles, 1):
-                    f.write(f"{i}. {title}\n")
-                
-                f.write("\n\nCHAPTERS:\n")
-                for t, title in aligned_chapters[:args.chapters]:
-                    f.write(f"{format_time(t)} {title}\n")
-                
-                f.write(f"\n\nYOUTUBE TAGS:\n{youtube_tags}\n")
-            
-            print(f"\n✅ Generated {len(aligned_chapters[:args.chapters])} chapters!")
-            print(f"💾 Saved to: {chapters_file}")
-            
-            print("\n📝 Suggested Titles:")
-            for i, title in enumerate(youtube_titles, 1):
-                print(f"   {i}. {title}")
-            
-            print("\n📋 Chapter Preview:")
-            for t, title in aligned_chapters[:args.chapters]:
-                print(f"   {format_time(t)} {title}")
-            print(f"\n🏷️ YouTube Tags:\n{youtube_tags}")
-        else:
-            print("Failed to generate chapters.")
+    if len(args.urls) == 1:
+        try:
+            print_result(run_job(args.urls[0], args.chapters, args.questions, args.api_key, not args.no_cache, print_streamed_chapter))
+        except ValueError as e:
+            print(f"Error: {e}")
+        except Exception as e:
+            print(f"An error occurred: {e}")
+        return
     
-    except Exception as e:
-        print(f"An error occurred: {e}")
-    finally:
-        # Cleanup audio file
-        if 'audio_file' in locals() and os.path.exists(audio_file):
-            os.remove(audio_file)
-            print(f"Cleaned up: {audio_file}")
+    print_outcomes(main_many(args.urls, args.chapters, args.questions, args.api_key, not args.no_cache))
 
 if __name__ == "__main__":
     main()
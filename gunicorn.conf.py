@@ -0,0 +1,30 @@
+"""
+gunicorn settings for the web interface (read automatically from the
+working directory):
+
+    gunicorn -b 0.0.0.0:5000 wsgi:application
+
+Deliberately no preload_app: CTranslate2's worker threads and CUDA contexts
+don't survive fork(), so each worker loads its own Whisper model after forking.
+"""
+
+import multiprocessing
+import os
+
+worker_class = 'gevent'
+# gevent already overlaps the I/O-bound requests inside a worker, so workers
+# only add transcription capacity, and each one costs a resident Whisper model
+# (RAM, and a CUDA context on GPU). Keep the default small; WEB_CONCURRENCY
+# overrides it.
+workers = int(os.getenv('WEB_CONCURRENCY') or min(2, multiprocessing.cpu_count()))
+worker_connections = 1000
+timeout = 1800
+
+def post_worker_init(worker):
+    # One transcription at a time per worker on an equal share of the cores,
+    # so all workers together use each core once. Then start loading Whisper
+    # on the worker's native thread (installed by wsgi.py) so the first
+    # request doesn't pay for it and the hub isn't blocked.
+    import generate_youtube_chapters
+    generate_youtube_chapters.size_whisper(1, multiprocessing.cpu_count() // worker.cfg.workers)
+    generate_youtube_chapters.TRANSCRIBE_EXECUTOR.submit(generate_youtube_chapters.get_whisper)
@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+"""
+LLM response cache
+Content-addressed SQLite cache for chat completion calls, so re-running a
+video (e.g. to try a different chapter count) doesn't re-pay identical calls.
+"""
+
+import contextlib
+import hashlib
+import json
+import os
+import sqlite3
+
+from openai.types.chat import ChatCompletion
+
+DEFAULT_CACHE_PATH = '~/.cache/ytchap.sqlite'
+
+# Upper bound on waiting for one call, retries and backoff included
+RESULT_TIMEOUT = 900
+
+def _connect():
+    # Read at call time so LLM_CACHE_PATH from config/config.env applies
+    path = os.path.expanduser(os.getenv('LLM_CACHE_PATH', DEFAULT_CACHE_PATH))
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    conn = sqlite3.connect(path, timeout=30)
+    conn.execute("CREATE TABLE IF NOT EXISTS cache (k TEXT PRIMARY KEY, v TEXT NOT NULL)")
+    return conn
+
+def cache_key(kwargs):
+    """Hash the full request (prompt, model, temperature, ...) into a cache key"""
+    return hashlib.sha256(json.dumps(kwargs, sort_keys=True).encode()).hexdigest()
+
+def cached_chat(batcher, use_cache=True, on_item=None, result_timeout=RESULT_TIMEOUT, **kwargs):
+    """Return batcher.submit(**kwargs).result(), served from the cache when possible.
+
+    Streamed requests resolve to JSON text and are stored as-is; regular
+    responses are stored via model_dump() and rebuilt as ChatCompletion objects.
+    use_cache=False skips the lookup but still stores the fresh result.
+    on_item is passed to batcher.submit and only fires on a cache miss.
+    Raises concurrent.futures.TimeoutError if no result arrives within
+    result_timeout seconds.
+    """
+    key = cache_key(kwargs)
+    row = None
+    if use_cache:
+        with contextlib.closing(_connect()) as conn:
+            row = conn.execute("SELECT v FROM cache WHERE k=?", (key,)).fetchone()
+    if row:
+        value = json.loads(row[0])
+        return value if kwargs.get('stream') else ChatCompletion.model_validate(value)
+
+    result = batcher.submit(on_item=on_item, **kwargs).result(timeout=result_timeout)
+    stored = result if kwargs.get('stream') else result.model_dump()
+    # closing() releases the connection; the inner with commits the insert
+    with contextlib.closing(_connect()) as conn, conn:
+        conn.execute("INSERT OR REPLACE INTO cache VALUES (?, ?)", (key, json.dumps(stored)))
+    return result
@@ -0,0 +1,132 @@
+"""
+Unit tests for the pure parsing, sampling and chunking helpers in
+generate_youtube_chapters (no network, Whisper model or web stack needed).
+"""
+
+import json
+import random
+
+import pytest
+
+for module in ('numpy', 'openai', 'httpx', 'orjson', 'tiktoken', 'yt_dlp', 'dotenv'):
+    pytest.importorskip(module)
+
+import generate_youtube_chapters as gyc
+
+REPLY = {
+    'chapters': [
+        {'timestamp': '00:00:00', 'title': 'Intro {with} "braces"'},
+        {'timestamp': '00:05:00', 'title': 'Back\\slash \\" and } brace'},
+    ],
+    'titles': ['Study Guide - One, Two, Three'],
+    'tags': '#A #B',
+}
+
+def _scan(pieces, on_item=None):
+    scanner = gyc.JSONObjectScanner(on_item)
+    for piece in pieces:
+        result = scanner.feed(piece)
+        if result is not None:
+            return result
+    return None
+
+def _random_split(text, rng):
+    cuts = sorted(rng.sample(range(1, len(text)), rng.randint(1, min(40, len(text) - 1))))
+    return [text[a:b] for a, b in zip([0] + cuts, cuts + [len(text)])]
+
+def test_scanner_random_splits_yield_object_and_items():
+    text = json.dumps(REPLY)
+    rng = random.Random(0)
+    for _ in range(200):
+        items = []
+        assert _scan(_random_split(text, rng), items.append) == text
+        assert [json.loads(item) for item in items] == REPLY['chapters']
+
+def test_scanner_item_split_across_chunks():
+    text = json.dumps(REPLY)
+    split = text.index('Intro') + 2
+    items = []
+    assert _scan([text[:split], text[split:]], items.append) == text
+    assert json.loads(items[0]) == REPLY['chapters'][0]
+
+def test_scanner_ignores_braces_and_escapes_in_strings():
+    text = json.dumps({'a': '}{"\\', 'b': {'c': '\\"}'}})
+    assert _scan(list(text)) == text
+
+def test_scanner_skips_preamble_and_trailing_prose():
+    text = json.dumps(REPLY)
+    assert _scan(['Sure! Here it is: ', text, ' Hope that helps {not json}']) == text
+
+def test_scanner_incomplete_object_returns_none():
+    assert _scan([json.dumps(REPLY)[:-1]]) is None
+
+class WordEncoding:
+    """Counts one token per whitespace-separated word"""
+
+    def encode_ordinary(self, text):
+        return text.split()
+
+def test_budget_transcript_text_ends_at_or_under_budget(monkeypatch):
+    monkeypatch.setattr(gyc, '_get_encoding', lambda model: WordEncoding())
+    transcript = [{'start': i * 5.0, 'text': 'word ' * 20} for i in range(2000)]
+    for budget in (50, 500, 3000):
+        text = gyc.budget_transcript_text(transcript, sample_size=400, budget=budget)
+        assert len(text.split()) <= budget
+        assert text
+
+def test_budget_transcript_text_keeps_sample_that_fits(monkeypatch):
+    monkeypatch.setattr(gyc, '_get_encoding', lambda model: WordEncoding())
+    transcript = [{'start': i * 5.0, 'text': 'short'} for i in range(10)]
+    assert gyc.budget_transcript_text(transcript, budget=1000) == gyc.sample_transcript_text(transcript, 400)
+
+def test_parse_metadata_reply_coerces_wrong_types():
+    result = gyc.parse_metadata_reply({
+        'chapters': [{'timestamp': None, 'title': 7}, 'not a chapter', {'title': None}],
+        'titles': ['1. Study Guide - Topics Here', 42, '#hashtag title here', 'short'],
+        'tags': ['#A', '#B'],
+    })
+    assert result['chapters'] == [
+        {'timestamp': '00:00:00', 'title': '7'},
+        {'timestamp': '00:00:00', 'title': 'Chapter'},
+    ]
+    assert result['titles'] == ['Study Guide - Topics Here']
+    assert result['tags'] == '#A #B'
+
+def test_parse_metadata_reply_defaults_for_missing_or_bad_fields():
+    result = gyc.parse_metadata_reply({'chapters': 'nope', 'titles': 'nope', 'tags': 5})
+    assert result == {'chapters': [], 'titles': gyc.DEFAULT_TITLES, 'tags': gyc.DEFAULT_TAGS}
+
+SR = gyc.WHISPER_SAMPLE_RATE
+CHUNK = gyc.WHISPER_CHUNK_SECONDS * SR
+WINDOW = gyc.WHISPER_CUT_WINDOW_SECONDS * SR
+
+def _fake_vad(pauses):
+    """VAD over absolute-sample audio (audio[i] == i) with silence around each pause"""
+    def speech_timestamps(samples):
+        lo, hi = int(samples[0]), int(samples[-1]) + 1
+        inside = [p for p in pauses if lo < p - SR // 2 and p + SR // 2 < hi]
+        edges = [lo] + [e for p in inside for e in (p - SR // 2, p + SR // 2)] + [hi]
+        return [{'start': a - lo, 'end': b - lo} for a, b in zip(edges[::2], edges[1::2])]
+    return speech_timestamps
+
+def _audio(seconds):
+    np = pytest.importorskip('numpy')
+    return np.arange(seconds * SR, dtype=np.int64)
+
+def test_chunk_bounds_without_pauses_cuts_at_nominal_positions(monkeypatch):
+    monkeypatch.setattr(gyc, '_speech_timestamps', _fake_vad([]))
+    audio = _audio(1000)
+    assert gyc._chunk_bounds(audio) == [0, CHUNK, 2 * CHUNK, 3 * CHUNK, len(audio)]
+
+def test_chunk_bounds_with_sparse_pauses(monkeypatch):
+    # One pause inside the first cut's window, one far outside the second's
+    near = CHUNK + 10 * SR
+    far = 2 * CHUNK - 2 * WINDOW
+    monkeypatch.setattr(gyc, '_speech_timestamps', _fake_vad([near, far]))
+    audio = _audio(700)
+    assert gyc._chunk_bounds(audio) == [0, near, 2 * CHUNK, len(audio)]
+
+def test_chunk_bounds_short_audio_is_one_chunk(monkeypatch):
+    monkeypatch.setattr(gyc, '_speech_timestamps', _fake_vad([]))
+    audio = _audio(100)
+    assert gyc._chunk_bounds(audio) == [0, len(audio)]
@@ -0,0 +1,132 @@
+"""
+Smoke test: one request end-to-end under gunicorn's gevent worker.
+
+Uses a cached transcript (so no download or Whisper) and a local fake of the
+OpenAI streaming endpoint, then checks that the job completes and its
+chapters file can be downloaded.
+"""
+
+import http.server
+import json
+import os
+import pathlib
+import socket
+import subprocess
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+
+import pytest
+
+for module in ('gevent', 'gunicorn', 'flask', 'openai', 'httpx', 'h2', 'numpy', 'orjson', 'tiktoken', 'yt_dlp', 'dotenv'):
+    pytest.importorskip(module)
+
+REPO = pathlib.Path(__file__).resolve().parent.parent
+VIDEO_ID = 'dQw4w9WgXcQ'
+
+REPLY = {
+    'chapters': [
+        {'timestamp': '00:00:00', 'title': 'Introduction'},
+        {'timestamp': '00:01:00', 'title': 'Main Topic'},
+    ],
+    'titles': ['Study Guide - Smoke, Test'],
+    'tags': '#Smoke #Test',
+}
+
+class FakeOpenAIHandler(http.server.BaseHTTPRequestHandler):
+    """Answer every chat completion with REPLY, streamed as server-sent events"""
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        text = json.dumps(REPLY)
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.end_headers()
+        for i in range(0, len(text), 20):
+            chunk = {
+                'id': 'chatcmpl-smoke', 'object': 'chat.completion.chunk', 'created': 0, 'model': 'gpt-4o-mini',
+                'choices': [{'index': 0, 'delta': {'content': text[i:i + 20]}, 'finish_reason': None}],
+            }
+            self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode())
+        self.wfile.write(b"data: [DONE]\n\n")
+
+    def log_message(self, *args):
+        pass
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+def _wait_for_port(port, proc, log_path, timeout=60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            pytest.fail(f"gunicorn exited early:\n{log_path.read_text(errors='replace')}")
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=1).close()
+            return
+        except OSError:
+            time.sleep(0.2)
+    pytest.fail("gunicorn did not start listening")
+
+def test_generate_and_download_under_gevent_worker(tmp_path):
+    import tiktoken
+    try:
+        tiktoken.encoding_for_model('gpt-4o-mini')
+    except Exception as e:
+        pytest.skip(f"tiktoken encoding unavailable: {e}")
+
+    cache_dir = tmp_path / 'cache'
+    cache_dir.mkdir()
+    (cache_dir / f"{VIDEO_ID}_transcript.json").write_text(json.dumps({
+        'video_info': {'id': VIDEO_ID, 'title': 'Smoke Test', 'duration': 120},
+        'transcript': [{'start': 0.0, 'text': 'Welcome.'}, {'start': 60.0, 'text': 'The main topic.'}],
+    }))
+
+    server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), FakeOpenAIHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    port = _free_port()
+    env = dict(
+        os.environ,
+        OPENAI_API_KEY='sk-smoke',
+        OPENAI_BASE_URL=f"http://127.0.0.1:{server.server_address[1]}/v1",
+        TRANSCRIPT_CACHE_DIR=str(cache_dir),
+        LLM_CACHE_PATH=str(tmp_path / 'llm.sqlite'),
+        # The post_worker_init load fails harmlessly; the cached transcript means it isn't needed
+        WHISPER_MODEL=str(tmp_path / 'no-model'),
+    )
+    log_path = tmp_path / 'gunicorn.log'
+    log = open(log_path, 'wb')
+    proc = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '-c', str(REPO / 'gunicorn.conf.py'), '--workers', '1',
+         '-b', f"127.0.0.1:{port}", '--chdir', str(tmp_path), '--pythonpath', str(REPO), 'wsgi:application'],
+        cwd=tmp_path, env=env, stdout=log, stderr=subprocess.STDOUT,
+    )
+    try:
+        _wait_for_port(port, proc, log_path)
+
+        request = urllib.request.Request(
+            f"http://127.0.0.1:{port}/api/generate",
+            data=json.dumps({'url': f"https://www.youtube.com/watch?v={VIDEO_ID}", 'chapters': 2}).encode(),
+            headers={'Content-Type': 'application/json'},
+        )
+        try:
+            with urllib.request.urlopen(request, timeout=120) as response:
+                result = json.loads(response.read())
+        except urllib.error.HTTPError as e:
+            pytest.fail(f"/api/generate returned {e.code}: {e.read().decode(errors='replace')}\n{log_path.read_text(errors='replace')}")
+        assert result['success'], result
+        assert [ch['title'] for ch in result['chapters']] == ['Introduction', 'Main Topic']
+
+        with urllib.request.urlopen(f"http://127.0.0.1:{port}/api/download/{VIDEO_ID}", timeout=30) as response:
+            assert response.status == 200
+            assert b'Main Topic' in response.read()
+    finally:
+        proc.terminate()
+        proc.wait(timeout=30)
+        log.close()
+        server.shutdown()
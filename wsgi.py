@@ -0,0 +1,39 @@
+#!/usr/bin/env python3
+"""
+WSGI entry point for production deployment
+
+Run with (settings come from gunicorn.conf.py):
+    gunicorn -b 0.0.0.0:5000 wsgi:application
+
+Each worker loads its own Whisper model after forking (see gunicorn.conf.py).
+"""
+
+# Patch sockets/ssl before anything imports openai (httpx) or yt_dlp so their
+# network calls yield to other requests instead of blocking the worker
+from gevent import monkey
+monkey.patch_all()
+
+import sys
+
+# httpcore imports trio when it is installed, and trio's import fails with
+# AttributeError (not ImportError) once select.epoll is patched away. Nothing
+# here uses trio, so make the import fail the way httpcore expects.
+sys.modules.setdefault('trio', None)
+
+from gevent.threadpool import ThreadPoolExecutor
+
+import generate_youtube_chapters
+from app import app as application
+
+# Whisper (CTranslate2) is an unpatched C extension; run it on a native
+# thread. One per worker: each worker transcribes a video at a time on its
+# share of the cores (see gunicorn.conf.py), and further jobs queue here.
+generate_youtube_chapters.TRANSCRIBE_EXECUTOR = ThreadPoolExecutor(max_workers=1)
+
+# The model lock is only taken on that native thread, so it must be a real
+# lock rather than the greenlet lock patch_all() made threading.Lock into
+generate_youtube_chapters._MODEL_LOCK = monkey.get_original('_thread', 'allocate_lock')()
+
+# No asyncio loop inside the worker's hub: each request's greenlet makes its
+# own (patched, so cooperative) synchronous OpenAI call
+generate_youtube_chapters.INLINE_CHAT = True